@@ -6,7 +6,49 @@ K_ABS_NOVORAPID = 3.0  # absorption rate constant (1/hr)
 K_ELIM_NOVORAPID = 0.8  # elimination rate constant (1/hr)  
 K_ABS_TRESIBA = 0.3   # very slow absorption rate constant (1/hr)
 K_ELIM_TRESIBA = 0.03 # very slow elimination rate constant (1
+# (k_abs, k_elim, k_abs - k_elim) per insulin type
+_INSULIN_PARAMS = {
+    'novorapid': (K_ABS_NOVORAPID, K_ELIM_NOVORAPID, K_ABS_NOVORAPID - K_ELIM_NOVORAPID),
+    'tresiba': (K_ABS_TRESIBA, K_ELIM_TRESIBA, K_ABS_TRESIBA - K_ELIM_TRESIBA),
+}
 # Insulin on board at t = 1 - Cumulative active insulin = 1 - integral of active insulin from 0 to t
+def _active_insulin_kernel(t, k_abs, k_elim, k_diff):
+    """
+    Bi-exponential active insulin for float64 array t and fixed rate constants.
+    """
+    # evaluated in place so only two buffers of len(t) are allocated
+    out = np.empty_like(t)
+    np.multiply(t, -k_elim, out=out)
+    np.exp(out, out=out)
+    e_abs = np.empty_like(t)
+    np.multiply(t, -k_abs, out=e_abs)
+    np.exp(e_abs, out=e_abs)
+    np.subtract(e_abs, out, out=out)
+    out *= k_elim * k_abs / k_diff
+    np.maximum(out, 0.0, out=out)
+    out[t <= 0] = 0.0
+    return out
+
+
+def _insulin_on_board_kernel(t, k_abs, k_elim, k_diff):
+    """
+    Bi-exponential insulin on board for float64 array t and fixed rate constants.
+    """
+    # evaluated in place so only two buffers of len(t) are allocated
+    out = np.empty_like(t)
+    np.multiply(t, -k_elim, out=out)
+    np.exp(out, out=out)
+    out *= k_abs / k_diff
+    e_abs = np.empty_like(t)
+    np.multiply(t, -k_abs, out=e_abs)
+    np.exp(e_abs, out=e_abs)
+    e_abs *= k_elim / k_diff
+    out -= e_abs
+    np.maximum(out, 0.0, out=out)
+    out[t <= 0] = 0.0
+    return out
+
+
 def active_insulin(t,type='novorapid'):
     """
     NovoRapid (insulin aspart) action profile for 1 unit
@@ -23,26 +65,24 @@ def active_insulin(t,type='novorapid'):
     - Duration: ~42+ hours (ultra-long acting)
     Using modified exponential model for depot formation
     
-    t: time in hours since dose administration
+    t: time in hours since dose administration, float or array-like
     type: type of insulin, 'novorapid' or 'tresiba'
     Returns: instantanious active insulin per unit injected at t=0
     """
-    if type=='novorapid':
-        k_abs = K_ABS_NOVORAPID
-        k_elim = K_ELIM_NOVORAPID   
-    elif type=='tresiba':
-        k_abs = K_ABS_TRESIBA
-        k_elim = K_ELIM_TRESIBA
-    else:
+    try:
+        k_abs, k_elim, k_diff = _INSULIN_PARAMS[type]
+    except KeyError:
         raise ValueError("Type must be 'novorapid' or 'tresiba'")
-    if t <= 0:
-        return 0
     
-        # Bi-exponential model: absorption - elimination
-    active_insulin = k_elim * k_abs * (-np.exp(-k_elim * t) + np.exp(-k_abs * t)) / (k_abs - k_elim)
+    # Scalar input: plain math avoids the NumPy dispatch overhead for one value
+    if np.isscalar(t):
+        if t <= 0:
+            return 0.0
+        active_insulin = k_elim * k_abs * (math.exp(-k_abs * t) - math.exp(-k_elim * t)) / k_diff
+        return active_insulin if active_insulin > 0 else 0.0
     
-       
-    return max(0, active_insulin)
+    # Bi-exponential model: absorption - elimination
+    return _active_insulin_kernel(np.asarray(t, dtype=np.float64), k_abs, k_elim, k_diff)
 
 
 def insulin_on_board(t,type='novorapid'):
@@ -61,27 +101,84 @@ def insulin_on_board(t,type='novorapid'):
     - Duration: ~42+ hours (ultra-long acting)
     Using modified exponential model for depot formation
     
-    t: time in hours since dose administration
+    t: time in hours since dose administration, float or array-like
     type: type of insulin, 'novorapid' or 'tresiba'
     returns fraction of insulin remaining active (IOB) at time t after injection
     0 <= IOB <= 1 
     1 unit injected at t=0           
     """
-    if type=='novorapid':
-        k_abs = K_ABS_NOVORAPID
-        k_elim = K_ELIM_NOVORAPID   
-    elif type=='tresiba':
-        k_abs = K_ABS_TRESIBA
-        k_elim = K_ELIM_TRESIBA
-    else:
+    try:
+        k_abs, k_elim, k_diff = _INSULIN_PARAMS[type]
+    except KeyError:
         raise ValueError("Type must be 'novorapid' or 'tresiba'")
-    if t <= 0:
-        return 0
     
-        # Bi-exponential model: absorption - elimination
-    insulin_on_board = ( k_abs  * np.exp(-k_elim * t) - k_elim * np.exp(-k_abs * t)) / (k_abs - k_elim)
+    # Scalar input: plain math avoids the NumPy dispatch overhead for one value
+    if np.isscalar(t):
+        if t <= 0:
+            return 0.0
+        insulin_on_board = (k_abs * math.exp(-k_elim * t) - k_elim * math.exp(-k_abs * t)) / k_diff
+        return insulin_on_board if insulin_on_board > 0 else 0.0
     
-       
-    return max(0, insulin_on_board)
+    # Bi-exponential model: absorption - elimination
+    return _insulin_on_board_kernel(np.asarray(t, dtype=np.float64), k_abs, k_elim, k_diff)
+
+# Lookup tables for repeated queries: 1 minute resolution over the window
+# each insulin type is tracked for in the time series calculations
+_INTERP_STEP_HOURS = 1 / 60
+_INTERP_HOURS = {'novorapid': 6.0, 'tresiba': 96.0}
+
+
+def _build_interp_tables():
+    tables = {}
+    for type, hours in _INTERP_HOURS.items():
+        k_abs, k_elim, k_diff = _INSULIN_PARAMS[type]
+        grid = np.arange(round(hours / _INTERP_STEP_HOURS) + 1) * _INTERP_STEP_HOURS
+        ai = _active_insulin_kernel(grid, k_abs, k_elim, k_diff)
+        iob = _insulin_on_board_kernel(grid, k_abs, k_elim, k_diff)
+        iob[0] = 1.0  # limit for t -> 0+, t <= 0 itself is masked to 0 on lookup
+        tables[type] = (grid, ai, iob)
+    return tables
 
 
+_INTERP_TABLES = _build_interp_tables()
+
+
+def _interpolate(t, type, column, kernel):
+    try:
+        grid = _INTERP_TABLES[type][0]
+        values = _INTERP_TABLES[type][column]
+    except KeyError:
+        raise ValueError("Type must be 'novorapid' or 'tresiba'")
+    t_arr = np.asarray(t, dtype=np.float64)
+    out = np.where(t_arr <= 0, 0.0, np.interp(t_arr, grid, values))
+    # Outside the table fall back to the exact model
+    beyond = t_arr > grid[-1]
+    if beyond.any():
+        out[beyond] = kernel(t_arr[beyond], *_INSULIN_PARAMS[type])
+    if np.isscalar(t):
+        return float(out)
+    return out
+
+
+def active_insulin_interp(t, type='novorapid'):
+    """
+    Table-based approximation of active_insulin for repeated queries.
+    Linear interpolation on a 1 minute grid (0-6 h novorapid, 0-96 h tresiba),
+    exact model beyond the grid. Absolute error < 1e-4 per unit.
+
+    t: time in hours since dose administration, float or array-like
+    type: type of insulin, 'novorapid' or 'tresiba'
+    """
+    return _interpolate(t, type, 1, _active_insulin_kernel)
+
+
+def insulin_on_board_interp(t, type='novorapid'):
+    """
+    Table-based approximation of insulin_on_board for repeated queries.
+    Linear interpolation on a 1 minute grid (0-6 h novorapid, 0-96 h tresiba),
+    exact model beyond the grid. Absolute error < 1e-4 per unit.
+
+    t: time in hours since dose administration, float or array-like
+    type: type of insulin, 'novorapid' or 'tresiba'
+    """
+    return _interpolate(t, type, 2, _insulin_on_board_kernel)
@@ -1,3 +1,4 @@
+import math
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.optimize import curve_fit
@@ -32,23 +33,28 @@ def fractional_absorption(time: Union[float, np.ndarray],
         1-fractional absorption at specified time(s), i.e. carbs on board which are not absorbed into blood glucose
     """
     
-    t = np.asarray(time)
+    # Scalar input: plain math avoids building arrays for a single value
+    if isinstance(time, (int, float, np.integer, np.floating)):
+        if time < lag_time:
+            return 0.0
+        return -f_max * math.expm1(-k_a * (time - lag_time))
     
-    # Apply lag time - no absorption before lag time
-    effective_time = np.maximum(t - lag_time, 0)
+    t = np.asarray(time, dtype=np.float64)
     
-    # First-order absorption equation
-    # f(t) = F_max * (1 - exp(-k_a * t)) for t >= t_lag
-    fraction = f_max * (1 - np.exp(-k_a * effective_time))
+    # Apply lag time - no absorption before lag time, those entries stay 0
+    # and are skipped by every step below (NaN times go through and stay NaN)
+    absorbing = ~(t < lag_time)
+    fraction = np.zeros(t.shape)
     
-    # Ensure no absorption before lag time
-    fraction = np.where(t < lag_time, 0, fraction)
+    # First-order absorption equation
+    # f(t) = F_max * (1 - exp(-k_a * (t - t_lag))) for t >= t_lag
+    # evaluated in place as -F_max * expm1(-k_a * (t - t_lag)) in a single buffer
+    np.subtract(t, lag_time, out=fraction, where=absorbing)
+    np.multiply(fraction, -k_a, out=fraction, where=absorbing)
+    np.expm1(fraction, out=fraction, where=absorbing)
+    np.multiply(fraction, -f_max, out=fraction, where=absorbing)
     
-    # Return scalar if input was scalar
-    if np.isscalar(time):
-        return float(fraction)
-    else:
-        return fraction
+    return fraction
 
 def carbs_on_board(time: Union[float, np.ndarray], 
                   total_carbs: float, 
@@ -76,9 +82,53 @@ def carbs_on_board(time: Union[float, np.ndarray],
     float or numpy.ndarray
         Carbs on board (grams) at specified time(s)
     """
-    if time == 0:
-        return 0
-    fraction_unabsorbed = f_max - fractional_absorption(time * 60, k_a, f_max, lag_time)
-    cob = total_carbs * fraction_unabsorbed
+    t = np.asarray(time, dtype=np.float64)
+    fraction_unabsorbed = f_max - fractional_absorption(t * 60, k_a, f_max, lag_time)
+    
+    # Nothing is on board until the carbs are eaten (t <= 0)
+    cob = np.where(t <= 0, 0.0, total_carbs * fraction_unabsorbed)
+    
+    # Return scalar if input was scalar
+    if np.isscalar(time):
+        return float(cob)
+    return cob
+
+
+# Lookup table of carbs on board per gram for repeated queries, 1 minute resolution over
+# the window the time series calculations track carbs for (as for the insulin tables)
+_INTERP_STEP_HOURS = 1 / 60
+_INTERP_HOURS = 48.0
+_INTERP_GRID = np.arange(round(_INTERP_HOURS / _INTERP_STEP_HOURS) + 1) * _INTERP_STEP_HOURS
+_INTERP_COB = carbs_on_board(_INTERP_GRID, 1.0)
+_INTERP_COB[0] = F_MAX  # limit for t -> 0+ (nothing absorbed yet), t <= 0 itself is masked to 0 on lookup
+
+
+def carbs_on_board_interp(time: Union[float, np.ndarray], 
+                          total_carbs: float) -> Union[float, np.ndarray]:
+    """
+    Table-based approximation of carbs_on_board (default model parameters) for repeated queries.
+    Linear interpolation on a 1 minute grid over 0-48 h, exact model beyond the grid.
     
-    return cob  
+    Parameters:
+    -----------
+    time : float or array-like
+        Time in hours
+    total_carbs : float
+        Total carbs ingested (grams)
+        
+    Returns:
+    --------
+    float or numpy.ndarray
+        Carbs on board (grams) at specified time(s)
+    """
+    t = np.asarray(time, dtype=np.float64)
+    cob = np.where(t <= 0, 0.0, np.interp(t, _INTERP_GRID, _INTERP_COB))
+    # Outside the table fall back to the exact model
+    beyond = t > _INTERP_GRID[-1]
+    if beyond.any():
+        cob[beyond] = carbs_on_board(t[beyond], 1.0)
+    cob *= total_carbs
+    
+    if np.isscalar(time):
+        return float(cob)
+    return cob
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 def analyze_hypoglycemia_treatment(data):
         
     # Analyze hypoglycemia episodes and subsequent carb treatments
@@ -8,65 +9,94 @@ def analyze_hypoglycemia_treatment(data):
 
     # Find all hypoglycemic episodes
     hypoglycemia_threshold = 4.5
-    hypo_episodes = []
-
-    # Sort data by datetime to ensure proper sequence
-    data_sorted = data.sort_values('DateTime_rounded').reset_index(drop=True)
-
-    # Find hypoglycemic episodes
-    for i, row in data_sorted.iterrows():
-        if row['glucose'] < hypoglycemia_threshold:
-            # Look ahead at following rows (next 2 hours or 24 readings)
-            max_lookhead = min(i + 24, len(data_sorted))  # Look ahead up to 24 readings (~2 hours)
-            following_data = data_sorted.iloc[i+1:max_lookhead].copy()
-            
-            # check if there is IOB at start if yes ignore this hypo episode
-            if row['IOB_novorapid'] > 0.1:
-                continue
-            
-            if len(following_data) > 0:
-                # Check if there's no bolus in the following period
-                no_bolus = (
-                    (following_data['carb_bolus'].fillna(0) == 0).all() and
-                    (following_data['correction_bolus'].fillna(0) == 0).all() and
-                    (following_data['extended_bolus'].fillna(0) == 0).all()
-                )
-                
-                # Check if there are carbs in the following period
-                #carbs_given = following_data['carbs'].fillna(0).sum()
-                COB_start = following_data.iloc[0]['COB']
-                COB_end = following_data.iloc[-1]['COB']
-                carbs_given = following_data['carbs'].fillna(0).sum() 
-                has_carbs = carbs_given > 0
-                
-                if no_bolus and has_carbs:
-                    # Find max glucose in following period
-                    valid_glucose = following_data['glucose'].dropna()
-                    if len(valid_glucose) > 0:
-                        max_glucose_after = valid_glucose.max()
-                        max_glucose_time = following_data.loc[following_data['glucose'] == max_glucose_after, 'DateTime_rounded'].iloc[0]
-                        
-                        # Calculate glucose difference
-                        glucose_difference = max_glucose_after - row['glucose']
-                        
-                        # Find when carbs were given
-                        carb_amount = following_data['carbs'].fillna(0).sum() + COB_start - COB_end
-
-                        hypo_episodes.append({
-                            'hypo_datetime': row['DateTime_rounded'],
-                            'hypo_glucose': row['glucose'],
-                            'period_of_day': row['period_of_day'],
-                            'carbs_given': carbs_given,
-                            'AoC': carb_amount,
-                            'max_glucose_after': max_glucose_after,
-                            'max_glucose_time': max_glucose_time,
-                            'glucose_difference': glucose_difference,
-                            'time_to_peak': (max_glucose_time - row['DateTime_rounded']).total_seconds() / 60,  # minutes
-                            'recovery_ratio': glucose_difference / carb_amount if carb_amount > 0 else 0  # glucose rise per gram of carbs
-                        })
+    lookahead = 24  # Look ahead up to 24 readings (~2 hours)
+
+    # Sort data by datetime to ensure proper sequence (only positional access
+    # is used below, so already sorted data is used as is without a copy)
+    if data['DateTime_rounded'].is_monotonic_increasing:
+        data_sorted = data
+    else:
+        data_sorted = data.sort_values('DateTime_rounded', kind='mergesort').reset_index(drop=True)
+
+    # Missing bolus / carb entries mean nothing was given, impute them in one pass
+    # (into a separate array, data_sorted may be the caller's frame)
+    treatments = data_sorted[['carb_bolus', 'correction_bolus', 'extended_bolus', 'carbs']].fillna(0).to_numpy(dtype=float)
+    carbs = treatments[:, 3]
+
+    # Check if there's no bolus in the following period: number of bolus rows in
+    # i+1 .. i+lookahead-1 from a running count
+    any_bolus = (treatments[:, :3] != 0).any(axis=1)
+    bolus_count = np.concatenate([[0], np.cumsum(any_bolus)])
+    rows = np.arange(len(data_sorted))
+    no_bolus = bolus_count[np.minimum(rows + lookahead, len(data_sorted))] == bolus_count[rows + 1]
+
+    # Hypo with no IOB at start (if there is IOB ignore this hypo episode)
+    is_hypo = ((data_sorted['glucose'] < hypoglycemia_threshold) & ~(data_sorted['IOB_novorapid'] > 0.1)).to_numpy()
+
+    # The cheap checks rule out most rows, the window statistics below are
+    # only computed for the remaining candidates
+    candidates = np.flatnonzero(is_hypo & no_bolus)
+
+    def following(values, fill):
+        # Following readings i+1 .. i+lookahead-1 of each candidate, taken from a
+        # strided view of the column padded with `fill` past the end of the data
+        padded = np.concatenate([values, np.full(lookahead, fill)])
+        return sliding_window_view(padded[1:], lookahead - 1)[candidates]
+
+    # Check if there are carbs in the following period
+    carbs_given_ahead = following(carbs, 0.0).sum(axis=1)
+    has_carbs = carbs_given_ahead > 0
+
+    # Max glucose in following period and the first reading reaching it
+    # (missing readings treated as -inf, so -inf means no valid readings)
+    glucose = data_sorted['glucose'].to_numpy(dtype=float)
+    following_glucose = following(glucose, np.nan)
+    following_glucose = np.where(np.isnan(following_glucose), -np.inf, following_glucose)
+    peak_offset = following_glucose.argmax(axis=1)
+    max_glucose_ahead = following_glucose[np.arange(len(candidates)), peak_offset]
+
+    # Matching hypoglycemic episodes
+    keep = has_carbs & np.isfinite(max_glucose_ahead)
+    episodes = candidates[keep]
+    peak = episodes + 1 + peak_offset[keep]
+
+    # Plain arrays for the per-episode lookups below
+    cob = data_sorted['COB'].to_numpy()
+    times = data_sorted['DateTime_rounded']
+    periods = data_sorted['period_of_day'].to_numpy()
+
+    hypo_time = times.array[episodes]
+    hypo_glucose = glucose[episodes]
+    max_glucose_after = max_glucose_ahead[keep]
+    max_glucose_time = times.array[peak]
+    carbs_given = carbs_given_ahead[keep]
+
+    # Calculate glucose difference
+    glucose_difference = max_glucose_after - hypo_glucose
+
+    # Find when carbs were given
+    COB_start = cob[episodes + 1]
+    COB_end = cob[np.minimum(episodes + lookahead, len(data_sorted)) - 1]
+    carb_amount = carbs_given + COB_start - COB_end
+
+    # glucose rise per gram of carbs
+    has_amount = carb_amount > 0
+    recovery_ratio = np.zeros(len(episodes))
+    np.divide(glucose_difference, carb_amount, out=recovery_ratio, where=has_amount)
 
     # Create DataFrame
-    df_hypo_treatment = pd.DataFrame(hypo_episodes)
+    df_hypo_treatment = pd.DataFrame({
+        'hypo_datetime': hypo_time,
+        'hypo_glucose': hypo_glucose,
+        'period_of_day': periods[episodes],
+        'carbs_given': carbs_given,
+        'AoC': carb_amount,
+        'max_glucose_after': max_glucose_after,
+        'max_glucose_time': max_glucose_time,
+        'glucose_difference': glucose_difference,
+        'time_to_peak': (max_glucose_time - hypo_time).total_seconds() / 60,  # minutes
+        'recovery_ratio': recovery_ratio
+    })
 
     print(f"Found {len(df_hypo_treatment)} hypoglycemic episodes with carb treatment (no bolus):")
     print("="*70)
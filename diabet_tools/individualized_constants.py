@@ -1,9 +1,30 @@
-import numpy as np
 import matplotlib.pyplot as plt
+from functools import lru_cache
 from typing import Union, List, Optional
 
 UNIT_CONVERSION = 0.0555  # Convert mg/dL to mmol/L (1 mg/dL = 0.0555 mmol/L)
 
+@lru_cache(maxsize=128)
+def body_surface_area(weight_kg: float, height_cm: float) -> float:
+    """
+    Body Surface Area (m²) using Dubois formula:
+    BSA = 0.007184 * weight^0.425 * height^0.725 (0 for a weight of 0, i.e. unknown)
+    
+    Parameters:
+    -----------
+    weight_kg : float
+        Patient weight in kilograms
+    height_cm : float
+        Patient height in centimeters
+        
+    Returns:
+    --------
+    float
+        Body surface area in m²
+    """
+    return 0.007184 * (weight_kg**0.425) * (height_cm**0.725)
+
+@lru_cache(maxsize=128)
 def calculate_insulin_clearance(height_cm: float = 170, 
                               weight_kg: Optional[float] = 53,
                               age_years: Optional[float] = 10,
@@ -58,8 +79,7 @@ def calculate_insulin_clearance(height_cm: float = 170,
             raise ValueError("Weight required for BSA-based clearance calculation")
         
         # Calculate Body Surface Area using Dubois formula
-        # BSA (m²) = 0.007184 * weight^0.425 * height^0.725
-        bsa = 0.007184 * (weight_kg**0.425) * (height_cm**0.725)
+        bsa = body_surface_area(weight_kg, height_cm)
         clearance = 0.65 * bsa  # L/min per m² BSA
         
     elif method == 'allometric':
@@ -82,11 +102,12 @@ def calculate_insulin_clearance(height_cm: float = 170,
         clearance *= max(age_factor, 0.7)  # Minimum 70% of adult clearance
     
     # Ensure reasonable bounds
-    clearance = np.clip(clearance, 0.5, 3.0)  # L/min bounds
+    clearance = 0.5 if clearance < 0.5 else (3.0 if clearance > 3.0 else clearance)  # L/min bounds
     
     return clearance
 
 
+@lru_cache(maxsize=128)
 def calculate_glucose_volume_distribution(height_cm: float = 170,
                                         weight_kg: Optional[float] = 53,
                                         age_years: Optional[float] = 10,
@@ -154,7 +175,7 @@ def calculate_glucose_volume_distribution(height_cm: float = 170,
             raise ValueError("Weight required for BSA-based volume calculation")
         
         # Calculate Body Surface Area using Dubois formula
-        bsa = 0.007184 * (weight_kg**0.425) * (height_cm**0.725)
+        bsa = body_surface_area(weight_kg, height_cm)
         
         # Glucose Vd ≈ 12-15 L/m² BSA
         volume = 13.5 * bsa  # L/m² BSA
@@ -191,11 +212,12 @@ def calculate_glucose_volume_distribution(height_cm: float = 170,
             volume *= max(age_factor, 0.85)  # Min 85% of adult volume
     
     # Ensure reasonable physiological bounds
-    volume = np.clip(volume, 5.0, 25.0)  # Reasonable range in liters
+    volume = 5.0 if volume < 5.0 else (25.0 if volume > 25.0 else volume)  # Reasonable range in liters
     
     return volume
 
 
+@lru_cache(maxsize=128)
 def carb_sensitivity_factor(
                             glucose_volume_distribution: Optional[float] = None,
                             height_cm: float = 170,
@@ -1,6 +1,7 @@
 def instantanious_AUC_I(CL, active_insulin, time_interval=5):
     """
     Calculate the instantaneous Area Under the Curve (AUC) for active insulin.
+    Kept for single values; use instantanious_AUC for whole time series.
     
     Parameters:
     -----------
@@ -27,6 +28,7 @@ def instantanious_AUC_I(CL, active_insulin, time_interval=5):
 def instantanious_AUC_G(basal_glucose, glucose, time_interval=5):
     """
     Calculate the instantaneous Area Under the Curve (AUC) for glucose.
+    Kept for single values; use instantanious_AUC for whole time series.
     
     Parameters:
     -----------
@@ -52,6 +54,7 @@ def instantanious_AUC_G(basal_glucose, glucose, time_interval=5):
 def instantanious_AUC_C(carb_unabsorbed, time_interval=5):
     """
     Calculate the instantaneous Area Under the Curve (AUC) for carbohydrate absorption.
+    Kept for single values; use instantanious_AUC for whole time series.
     
     Parameters:
     -----------
@@ -74,3 +77,38 @@ def instantanious_AUC_C(carb_unabsorbed, time_interval=5):
 
     return auc
 
+def instantanious_AUC(CL, active_insulin, basal_glucose, glucose, carb_unabsorbed, time_interval=5):
+    """
+    Calculate the instantaneous insulin, glucose and carbohydrate AUCs in one call.
+    Inputs may be scalars or NumPy arrays (e.g. a whole time series), so a series
+    is handled with three array multiplies instead of three calls per time step.
+    
+    Parameters:
+    -----------
+    CL : float
+        Insulin clearance rate (L/min)
+    active_insulin : float or numpy.ndarray
+        Active insulin amount (units)
+    basal_glucose : float 
+        base to measure excess from (mmol/dL), e.g. 5.6
+    glucose : float or numpy.ndarray
+        Blood glucose concentration (mmol/dL)
+    carb_unabsorbed : float or numpy.ndarray
+        Amount of carbohydrates absorbed (g)
+    time_interval : float, default=5
+        Time interval in minutes over which to calculate AUC
+        
+    Returns:
+    --------
+    tuple
+        (insulin AUC, glucose AUC, carbohydrate AUC), same as instantanious_AUC_I,
+        instantanious_AUC_G and instantanious_AUC_C
+    """
+    # Convert time interval from minutes to hours once for all three AUCs
+    time_interval_hr = time_interval / 60.0
+    
+    auc_I = (active_insulin / CL) * time_interval_hr
+    auc_G = (glucose - basal_glucose) * time_interval_hr
+    auc_C = carb_unabsorbed * time_interval_hr
+    
+    return auc_I, auc_G, auc_C
@@ -1,8 +1,73 @@
 
+from functools import lru_cache
+
 import numpy as np
 import matplotlib.pyplot as plt
 from typing import Union, List, Optional
 from scipy.special import gamma
+from .individualized_constants import body_surface_area
+
+def _cl_height(height_cm, weight_kg, sex_lower):
+    # Primary method: Height-based clearance
+    # Reference clearance: ~1.2 L/min for 170 cm individual
+    base_clearance = 1.2  # L/min for reference height (170 cm)
+    height_factor = (height_cm - 170) / 100  # Normalized height difference
+    clearance = base_clearance * (1 + 0.4 * height_factor)
+    
+    # Sex adjustment (females typically 10-15% lower clearance)
+    if sex_lower == 'female':
+        clearance *= 0.85
+    return clearance
+
+def _cl_bsa(height_cm, weight_kg, sex_lower):
+    if weight_kg is None:
+        raise ValueError("Weight required for BSA-based clearance calculation")
+    
+    return 0.65 * body_surface_area(weight_kg, height_cm)  # L/min per m² BSA
+
+def _cl_allometric(height_cm, weight_kg, sex_lower):
+    if weight_kg is None:
+        raise ValueError("Weight required for allometric clearance calculation")
+    
+    # Allometric scaling based on weight
+    clearance = 1.5 * (weight_kg / 70.0)**0.75
+    
+    # Height adjustment
+    height_factor = height_cm / 170.0
+    return clearance * height_factor**0.25
+
+_CLEARANCE_METHODS = {
+    'height_based': _cl_height,
+    'bsa': _cl_bsa,
+    'allometric': _cl_allometric,
+}
+
+def _sex_key(sex):
+    """ Lowercased sex for the cached helpers, non-str values (None, NaN) are passed through. """
+    return sex.lower() if isinstance(sex, str) else sex
+
+@lru_cache(maxsize=1024)
+def _calc_clearance_cached(height_cm, weight_kg, age_years, sex_lower, method):
+    """
+    Cached clearance computation behind calculate_insulin_clearance, keyed on
+    hashable scalar inputs with sex already lowercased.
+    """
+    
+    try:
+        clearance_fn = _CLEARANCE_METHODS[method]
+    except KeyError:
+        raise ValueError("Method must be 'height_based', 'bsa', or 'allometric'") from None
+    clearance = clearance_fn(height_cm, weight_kg, sex_lower)
+    
+    # Age adjustment (clearance decreases ~1% per year after 40)
+    if age_years is not None and age_years > 40:
+        age_factor = 1 - 0.01 * (age_years - 40)
+        clearance *= max(age_factor, 0.7)  # Minimum 70% of adult clearance
+    
+    # Ensure reasonable bounds
+    clearance = 0.5 if clearance < 0.5 else 3.0 if clearance > 3.0 else clearance  # L/min bounds
+    
+    return clearance
 
 def calculate_insulin_clearance(height_cm: float, 
                               weight_kg: Optional[float] = None,
@@ -42,63 +107,48 @@ def calculate_insulin_clearance(height_cm: float,
     - Allometric: CL = 1.5 * (weight/70)^0.75  [L/min]
     """
     
-    if method == 'height_based':
-        # Primary method: Height-based clearance
-        # Reference clearance: ~1.2 L/min for 170 cm individual
-        base_clearance = 1.2  # L/min for reference height (170 cm)
-        height_factor = (height_cm - 170) / 100  # Normalized height difference
-        clearance = base_clearance * (1 + 0.4 * height_factor)
-        
-        # Sex adjustment (females typically 10-15% lower clearance)
-        if sex.lower() == 'female':
-            clearance *= 0.85
-            
-    elif method == 'bsa':
-        if weight_kg is None:
-            raise ValueError("Weight required for BSA-based clearance calculation")
-        
-        # Calculate Body Surface Area using Dubois formula
-        # BSA (m²) = 0.007184 * weight^0.425 * height^0.725
-        bsa = 0.007184 * (weight_kg**0.425) * (height_cm**0.725)
-        clearance = 0.65 * bsa  # L/min per m² BSA
-        
-    elif method == 'allometric':
-        if weight_kg is None:
-            raise ValueError("Weight required for allometric clearance calculation")
-        
-        # Allometric scaling based on weight
-        clearance = 1.5 * (weight_kg / 70.0)**0.75
-        
-        # Height adjustment
-        height_factor = height_cm / 170.0
-        clearance *= height_factor**0.25
-        
-    else:
-        raise ValueError("Method must be 'height_based', 'bsa', or 'allometric'")
-    
-    # Age adjustment (clearance decreases ~1% per year after 40)
-    if age_years is not None and age_years > 40:
-        age_factor = 1 - 0.01 * (age_years - 40)
-        clearance *= max(age_factor, 0.7)  # Minimum 70% of adult clearance
-    
-    # Ensure reasonable bounds
-    clearance = np.clip(clearance, 0.5, 3.0)  # L/min bounds
-    
-    return clearance
+    # Only the height-based method looks at sex, which may be None for the others
+    return _calc_clearance_cached(height_cm, weight_kg, age_years, _sex_key(sex), method)
+
+def _pk_kernel(t, ka, ke, scale):
+    """
+    Closed-form absorption/elimination curve scale * (exp(-ke*t) - exp(-ka*t))
+    for a float64 array t, evaluated in place in two buffers. The rate constants
+    and scale may be arrays broadcasting against t (one row per patient).
+    """
+    out = np.empty(np.broadcast_shapes(np.shape(t), np.shape(ke), np.shape(scale)))
+    np.multiply(t, -ke, out=out)
+    np.exp(out, out=out)
+    e_ka = np.empty_like(t)
+    np.multiply(t, -ka, out=e_ka)
+    np.exp(e_ka, out=e_ka)
+    out -= e_ka
+    out *= scale
+    return out
+
+def _decay_kernel(t, k, scale):
+    """
+    Single exponential decay scale * exp(-k*t) for a float64 array t.
+    """
+    out = np.empty_like(t)
+    np.multiply(t, -k, out=out)
+    np.exp(out, out=out)
+    out *= scale
+    return out
 
 def novorapid_pharmacokinetics(t, dose_units, CL, ka=0.15, Vd=0.15):
     """
     Calculate active insulin concentration over time for NovoRapid.
     
     Parameters:
-    t: Time in minutes
+    t: Time in minutes, scalar or array
     dose_units: Insulin dose in units
     CL: Plasma clearance in L/min
     ka: Absorption rate constant (1/min) - default for rapid-acting
     Vd: Volume of distribution in L/kg (default ~0.15 L/kg for a 70kg person = ~10.5L)
     
     Returns:
-    Active insulin concentration in units/L
+    Active insulin concentration in units/L, float for scalar t and array otherwise
     """
     # Convert dose to amount (1 unit = ~6 nmol, but we'll work in units)
     # Assume average weight of 70kg for Vd calculation
@@ -109,13 +159,16 @@ def novorapid_pharmacokinetics(t, dose_units, CL, ka=0.15, Vd=0.15):
     
     # Two-compartment model: absorption and elimination
     # For subcutaneous injection, we model absorption from injection site
-    if t <= 0:
-        return 0
+    time = np.asarray(t, dtype=np.float64)
     
     # Concentration = (Dose/Vd) * (ka/(ka-ke)) * (exp(-ke*t) - exp(-ka*t))
-    conc = 0.95*(dose_units / Vd_total) * (ka / (ka - ke)) * (np.exp(-ke * t) - np.exp(-ka * t))
+    conc = _pk_kernel(time, ka, ke, 0.95*(dose_units / Vd_total) * (ka / (ka - ke)))
+    conc[time <= 0] = 0
+    np.maximum(conc, 0, out=conc)
     
-    return max(0, conc)
+    if np.isscalar(t):
+        return float(conc)
+    return conc
 
 def tresiba_active_insulin(time: Union[float, List[float]], 
                           units: float = 1.0,
@@ -186,35 +239,29 @@ def tresiba_active_insulin(time: Union[float, List[float]],
     bioavailability = 0.70  # 70% bioavailability
     depot_factor = 0.6  # Slow release from subcutaneous hexamer depot
     
+    # ka is fixed and ke comes from the patient clearance, they never coincide
+    # in practice but the depot term below divides by their difference
+    if ka == ke:
+        raise ValueError("Absorption and elimination rate constants must differ")
+    
     # Handle both single values and arrays
-    t = np.asarray(time)
-    t = np.maximum(t, 0)  # Ensure non-negative time
+    t = np.maximum(np.asarray(time, dtype=np.float64), 0.0)  # Ensure non-negative time
     
     # Two-compartment model with depot formation (Tresiba-specific)
     # Accounts for slow absorption from hexamer formation
     
     # Fast absorption component (minor)
-    fast_component = 0.3 * np.exp(-0.15 * t)  # Quick initial absorption
-    
-    # Slow depot release (major component for Tresiba)
-    if ka != ke:
-        slow_component = (ka / (ka - ke)) * (np.exp(-ke * t) - np.exp(-ka * t))
-    else:
-        # Handle case where ka = ke
-        slow_component = ka * t * np.exp(-ke * t)
+    active = _decay_kernel(t, 0.15, 0.3)  # Quick initial absorption
     
-    # Combined absorption profile
-    absorption_profile = fast_component + depot_factor * slow_component
+    # Slow depot release (major component for Tresiba), combined absorption profile
+    active += _pk_kernel(t, ka, ke, depot_factor * ka / (ka - ke))
     
-    # Scale by dose and bioavailability
-    active = units * bioavailability * absorption_profile
-    
-    # Apply clearance scaling factor
+    # Scale by dose and bioavailability, and apply clearance scaling factor
     clearance_scaling = clearance_L_per_min / 1.2  # Normalize to reference clearance
-    active *= (1 / clearance_scaling)  # Higher clearance = lower active insulin
+    active *= units * bioavailability / clearance_scaling  # Higher clearance = lower active insulin
     
     # Ensure realistic bounds
-    active = np.maximum(active, 0)
+    np.maximum(active, 0.0, out=active)
     
     # Return scalar if input was scalar
     if np.isscalar(time):
@@ -222,6 +269,72 @@ def tresiba_active_insulin(time: Union[float, List[float]],
     else:
         return active
 
+def tresiba_active_insulin_batch(time: Union[float, List[float]],
+                                 units: Union[float, List[float]] = 1.0,
+                                 height_cm: Union[float, List[float]] = 170.0,
+                                 weight_kg: Optional[Union[float, List[float]]] = None,
+                                 age_years: Optional[Union[float, List[float]]] = None,
+                                 sex: Union[str, List[str]] = 'male',
+                                 clearance_method: str = 'height_based') -> np.ndarray:
+    """
+    Calculate Tresiba active insulin for a cohort of N patients at T time points.
+    
+    Same model as tresiba_active_insulin, with patient parameters given as
+    length-N arrays (or scalars shared by all patients) and broadcast against
+    the time axis, so the whole cohort is evaluated in one NumPy pass.
+    
+    Parameters:
+    -----------
+    time : float or array-like
+        Time in hours since injection, shape (T,)
+    units : float or array-like, default=1.0
+        Units injected per patient
+    height_cm : float or array-like, default=170.0
+        Patient heights in centimeters, shape (N,)
+    weight_kg : float or array-like, optional
+        Patient weights in kilograms, NaN for unknown; estimated from height when missing
+    age_years : float or array-like, optional
+        Patient ages in years, NaN for unknown
+    sex : str or array-like of str, default='male'
+        Patient sex ('male' or 'female')
+    clearance_method : str, default='height_based'
+        Method for calculating insulin clearance
+        
+    Returns:
+    --------
+    numpy.ndarray
+        Active insulin of shape (N, T)
+    """
+    height, weight, age, dose, sex_arr = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in
+          (height_cm, np.nan if weight_kg is None else weight_kg, np.nan if age_years is None else age_years, units)),
+        np.atleast_1d(np.asarray(sex, dtype=object)))
+    
+    # Per-patient parameters go through the cached scalar formulas, only the (N, T) curves are vectorized
+    clearance_L_per_min = np.empty(len(height))
+    estimated_weight = np.empty(len(height))
+    for i, (h, w, a, s) in enumerate(zip(height.tolist(), weight.tolist(), age.tolist(), sex_arr)):
+        w = None if np.isnan(w) else w
+        a = None if np.isnan(a) else a
+        s = _sex_key(s)
+        clearance_L_per_min[i] = _calc_clearance_cached(h, w, a, s, clearance_method)
+        estimated_weight[i] = w if w else _estimate_weight_cached(h, s)
+    clearance_L_per_min = clearance_L_per_min[:, None]
+    
+    ke = clearance_L_per_min * 60 / (0.4 * estimated_weight[:, None])
+    ka = 0.08
+    if np.any(ke == ka):
+        raise ValueError("Absorption and elimination rate constants must differ")
+    
+    t = np.maximum(np.atleast_1d(np.asarray(time, dtype=np.float64)), 0.0)[None, :]
+    
+    active = _pk_kernel(t, ka, ke, 0.6 * ka / (ka - ke))
+    active += _decay_kernel(t, 0.15, 0.3)
+    active *= dose[:, None] * 0.70 / (clearance_L_per_min / 1.2)
+    
+    np.maximum(active, 0.0, out=active)
+    return active
+
 def estimate_weight_from_height(height_cm: float, sex: str = 'male') -> float:
     """
     Estimate weight from height using standard formulas when weight is not available.
@@ -230,9 +343,13 @@ def estimate_weight_from_height(height_cm: float, sex: str = 'male') -> float:
     - Male: 50 + 2.3 * (height_in - 60)
     - Female: 45.5 + 2.3 * (height_in - 60)
     """
+    return _estimate_weight_cached(height_cm, _sex_key(sex))
+
+@lru_cache(maxsize=1024)
+def _estimate_weight_cached(height_cm, sex_lower):
     height_inches = height_cm / 2.54
     
-    if sex.lower() == 'male':
+    if sex_lower == 'male':
         weight_kg = 50 + 2.3 * (height_inches - 60)
     else:
         weight_kg = 45.5 + 2.3 * (height_inches - 60)
@@ -1,10 +1,14 @@
 import sqlite3
 import os
+import numpy as np
 import pandas as pd
 import pytz
 import requests
 import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 XDRIP_PATH = ['./xDrip/export20250831-192101/export20250831-192101.sqlite',
     '/xDrip/export20250903-113335/export20250903-113335.sqlite']
@@ -17,6 +21,60 @@ OUTPUT_DB = "nightscout_data.sqlite"
 # === NIGHTSCOUT PARAMETERS ===
 BATCH_SIZE = 1000000
 
+# Keep-alive session shared by the Nightscout downloaders, retries transient 5xx errors
+# (the last 5xx response is returned rather than raised, so the status_code checks below still report it)
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1,
+                       max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504],
+                                         raise_on_status=False))
+_session.mount('https://', _adapter)
+_session.mount('http://', _adapter)
+_session.headers['Accept-Encoding'] = 'gzip'
+
+def _read_one_xdrip(i, xdrip_path, table_name):
+    ''' Reads table_name from the i-th xDrip database. Returns the table (None if it is missing
+    or unreadable) and the progress messages, which the caller prints in path order. '''
+    if not os.path.exists(xdrip_path):
+        return None, [f"SQLite file not found: {xdrip_path}"]
+    
+    messages = [f"Reading from path {i}: {xdrip_path}"]
+    # Connect to the database
+    conn = sqlite3.connect(xdrip_path)
+
+    try:
+        if table_name=='BgReadings':
+            # Average glucose values in 5-min windows inside SQLite, raw_data is mg/dL * 1000
+            # and xDrip timestamps are milliseconds since epoch
+            cursor = conn.execute(f"""
+                SELECT CAST(timestamp AS INTEGER) / 300000 * 300000 AS bucket,
+                       AVG(raw_data) / 18000.0
+                FROM {table_name}
+                GROUP BY bucket
+                HAVING COUNT(raw_data) > 0
+                ORDER BY bucket""")
+            # Fill NumPy arrays straight from the cursor, float32 is ample for mmol/L readings
+            # and halves the bytes touched by the overlap resolution
+            rows = np.fromiter(cursor, dtype=[('bucket', np.int64), ('reading', np.float32)])
+            df_table = pd.DataFrame({
+                'DateTime_rounded': pd.to_datetime(rows['bucket'], unit='ms', utc=True).tz_convert(pytz.timezone('EET')),
+                'Sensor Reading(mmol/L)': rows['reading'],
+            })
+        else:
+            df_table = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
+        
+        # Add source path index for overlap resolution
+        df_table['source_index'] = np.int8(i)
+        messages.append(f"  Successfully read {len(df_table)} records")
+        return df_table, messages
+
+    except Exception as e:
+        messages.append(f"  Error reading table {table_name} from {xdrip_path}: {e}")
+        return None, messages
+
+    finally:
+        # Close connection
+        conn.close()
+
 def read_xDrip(table_name = 'BgReadings', xdrip_paths = XDRIP_PATH):
     ''' Reads a specified table from xDrip SQLite databases and returns it as a DataFrame. 
     Handles multiple database paths, resolves overlaps by prioritizing higher index paths.
@@ -53,44 +111,15 @@ def read_xDrip(table_name = 'BgReadings', xdrip_paths = XDRIP_PATH):
     29. BgReadings
     30. UploaderQueue'''
     
+    # Read the databases in parallel, keeping results and progress messages in path order
     all_dataframes = []
-    
-    # Read from each path in the list
-    for i, xdrip_path in enumerate(xdrip_paths):
-        if os.path.exists(xdrip_path):
-            print(f"Reading from path {i}: {xdrip_path}")
-            # Connect to the database
-            conn = sqlite3.connect(xdrip_path)
-
-            try:
-                df_table = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-                
-                if table_name=='BgReadings':
-                    df_table['Sensor Reading(mmol/L)'] = df_table['raw_data']/1000/18
-                    # Convert timestamp to datetime (xDrip uses milliseconds since epoch)
-                    df_table['datetime'] = pd.to_datetime(df_table['timestamp'], unit='ms', utc=True).dt.tz_convert(pytz.timezone('EET'))
-                    
-                    df_table = df_table.set_index('datetime').resample('5min').agg({
-                            'Sensor Reading(mmol/L)': 'mean'  # Take average of glucose values in each 5-min window
-                        }).dropna()
-                    df_table = df_table.reset_index()
-                    df_table['DateTime_rounded'] = df_table['datetime'].dt.floor('5min')
-                    df_table = df_table[['DateTime_rounded', 'Sensor Reading(mmol/L)']]
-                
-                # Add source path index for overlap resolution
-                df_table['source_index'] = i
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        futures = [ex.submit(_read_one_xdrip, i, xdrip_path, table_name) for i, xdrip_path in enumerate(xdrip_paths)]
+        for future in futures:
+            df_table, messages = future.result()
+            print('\n'.join(messages))
+            if df_table is not None:
                 all_dataframes.append(df_table)
-                print(f"  Successfully read {len(df_table)} records")
-
-            except Exception as e:
-                print(f"  Error reading table {table_name} from {xdrip_path}: {e}")
-                continue
-
-            finally:
-                # Close connection
-                conn.close()
-        else:
-            print(f"SQLite file not found: {xdrip_path}")
     
     # If no data was read from any path
     if not all_dataframes:
@@ -102,14 +131,11 @@ def read_xDrip(table_name = 'BgReadings', xdrip_paths = XDRIP_PATH):
     
     # Handle overlaps by keeping entries from higher index paths
     if table_name == 'BgReadings':
-        # Sort by DateTime_rounded and source_index (higher index = higher priority)
-        combined_df = combined_df.sort_values(['DateTime_rounded', 'source_index'])
-        
-        # Remove duplicates, keeping the last occurrence (highest source_index)
-        combined_df = combined_df.drop_duplicates(subset=['DateTime_rounded'], keep='last')
+        # Keep the row with the highest source_index (higher index = higher priority) per DateTime_rounded
+        best = combined_df.groupby('DateTime_rounded')['source_index'].idxmax()
         
         # Remove the helper column and sort by datetime
-        combined_df = combined_df.drop('source_index', axis=1).sort_values('DateTime_rounded').reset_index(drop=True)
+        combined_df = combined_df.loc[best].drop('source_index', axis=1).sort_values('DateTime_rounded').reset_index(drop=True)
         
         print(f"Final combined dataset: {len(combined_df)} records after overlap resolution")
     else:
@@ -122,9 +148,9 @@ def read_diabetesm(diabetesm_path = DIABETESM_PATH):
     ''' Reads DiabetesM CSV file and returns it as a DataFrame. '''
     if os.path.exists(diabetesm_path):
         try:
-            df = pd.read_csv(diabetesm_path, skiprows=1)  # Skip first row with metadata
-            df = df[~df['DateTimeFormatted'].astype(str).str.startswith('00')]
-            df['DateTimeFormatted'] = pd.to_datetime(df['DateTimeFormatted']).dt.tz_localize(pytz.timezone('EET'))
+            df = pd.read_csv(diabetesm_path, skiprows=1, dtype={'DateTimeFormatted': str})  # Skip first row with metadata
+            df = df[~df['DateTimeFormatted'].str.startswith('00', na=False)]
+            df['DateTimeFormatted'] = pd.to_datetime(df['DateTimeFormatted'], format='ISO8601', cache=True).dt.tz_localize(pytz.timezone('EET'))
             df['DateTime_rounded'] = df['DateTimeFormatted'].dt.round('5min')
             # we have garbage in the file before that and we need to use archived file before garbage import
             
@@ -172,13 +198,13 @@ def download_nightscout_data(start_date=None):
     done = False
 
     print("Starting Nightscout download...")
-    df_output = pd.DataFrame()
+    batches = []
     while not done:
         url = f"{NIGHTSCOUT_URL}/api/v1/entries.json?count={BATCH_SIZE}&skip={skip}"
         if start_date_ms:
             url += f"&find[date][$gte]={start_date_ms}"
 
-        r = requests.get(url, headers=headers)
+        r = _session.get(url, headers=headers)
         if r.status_code != 200:
             print(f"Error {r.status_code}: {r.text}")
             break
@@ -188,20 +214,33 @@ def download_nightscout_data(start_date=None):
             print("No more data found.")
             break
 
-        df_batch = pd.json_normalize(entries)
-        df_batch['Sensor Reading(mmol/L)'] = df_batch['sgv']/18
-        df_batch['datetime_utc']= pd.to_datetime(df_batch['date'], unit='ms', utc=True)
-        df_batch['datetime']=df_batch['datetime_utc'].dt.tz_convert('EET')
-        #df_batch['datetime']= pd.to_datetime(df_batch['dateString'], utc=True).dt.tz_convert('EET')
+        # Only date and sgv are used, skip flattening the remaining fields
+        df_batch = pd.DataFrame(entries, columns=['date', 'sgv'])
+        sgv = df_batch['sgv'].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(sgv) & df_batch['date'].notna().to_numpy()
+        
+        # Take average of glucose values in each 5-min window: floor the millisecond timestamps
+        # to bucket numbers and sum/count per bucket with bincount
+        bucket = df_batch['date'].to_numpy()[valid].astype(np.int64) // 300000
+        step = np.diff(bucket)
+        if (step > 0).all() or (step < 0).all():
+            # At most one reading per window (usual CGM cadence), the means are the readings themselves
+            order = slice(None) if len(step) == 0 or step[0] > 0 else slice(None, None, -1)
+            bucket = bucket[order]
+            readings = sgv[valid][order] / 18
+        else:
+            first_bucket = bucket.min()
+            sums = np.bincount(bucket - first_bucket, weights=sgv[valid])
+            counts = np.bincount(bucket - first_bucket)
+            nonempty = np.flatnonzero(counts)
+            bucket = nonempty + first_bucket
+            readings = sums[nonempty] / counts[nonempty] / 18
         
-        df_batch = df_batch.set_index('datetime_utc').resample('5min').agg({
-                            'Sensor Reading(mmol/L)': 'mean'  # Take average of glucose values in each 5-min window
-                        }).dropna()
-        df_batch = df_batch.reset_index()
-        df_batch['DateTime_rounded_utc'] = df_batch['datetime_utc'].dt.floor('5min')
-        df_batch['DateTime_rounded'] = df_batch['DateTime_rounded_utc'].dt.tz_convert('EET')
-        df_batch = df_batch[['DateTime_rounded', 'Sensor Reading(mmol/L)']]
-        df_output = pd.concat([df_output, df_batch], ignore_index=True)
+        df_batch = pd.DataFrame({
+            'DateTime_rounded': pd.to_datetime(bucket * 300000, unit='ms', utc=True).tz_convert('EET'),
+            'Sensor Reading(mmol/L)': readings,
+        })
+        batches.append(df_batch)
 
         all_count += len(entries)
         skip += len(entries)
@@ -213,6 +252,7 @@ def download_nightscout_data(start_date=None):
             done = True
 
         time.sleep(0.2)  # be nice to server
+    df_output = pd.concat(batches, ignore_index=True) if batches else pd.DataFrame()
     return df_output
 
 def create_nightscout_db(start_date=None):
@@ -232,6 +272,9 @@ def create_nightscout_db(start_date=None):
     
     # Connect to SQLite
     conn = sqlite3.connect(OUTPUT_DB)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
     cur = conn.cursor()
 
     # Create table for glucose entries
@@ -266,7 +309,7 @@ def create_nightscout_db(start_date=None):
         if start_date_ms:
             url += f"&find[date][$gte]={start_date_ms}"
 
-        r = requests.get(url, headers=headers)
+        r = _session.get(url, headers=headers)
         if r.status_code != 200:
             print(f"Error {r.status_code}: {r.text}")
             break
@@ -276,13 +319,13 @@ def create_nightscout_db(start_date=None):
             print("No more data found.")
             break
 
-        # Insert batch into SQLite
-        for e in entries:
-            cur.execute("""
+        # Insert batch into SQLite in a single transaction
+        with conn:
+            cur.executemany("""
             INSERT OR IGNORE INTO entries
             (_id, device, date, dateString, sgv, direction, type, filtered, unfiltered, rssi)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+            """, ((
                 e.get("_id"),
                 e.get("device"),
                 e.get("date"),
@@ -293,9 +336,8 @@ def create_nightscout_db(start_date=None):
                 e.get("filtered"),
                 e.get("unfiltered"),
                 e.get("rssi")
-            ))
+            ) for e in entries))
 
-        conn.commit()
         all_count += len(entries)
         skip += len(entries)
 
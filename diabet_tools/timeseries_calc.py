@@ -1,7 +1,10 @@
+from bisect import bisect_right
+from functools import lru_cache, partial
 import pandas as pd
 import numpy as np
-from .active_insulin import  insulin_on_board
-from .fractional_absorption import carbs_on_board
+from scipy.signal import fftconvolve
+from .active_insulin import  insulin_on_board, insulin_on_board_interp
+from .fractional_absorption import carbs_on_board, carbs_on_board_interp
 from .individualized_constants import calculate_insulin_clearance, calculate_glucose_volume_distribution
 BW =53 #body weight kg
 HEIGHT_CM =170
@@ -9,10 +12,70 @@ AGE_YEARS =14
 CONVERSION =18 # to convert mg/dL to mmol/L
 GEZI = 0.01 #dL/kg/min glucose efectiveness at zero insulin
 
+# DateTime_rounded is sampled every 5 minutes, on that grid the IOB/COB propagation is a convolution
+GRID_SECONDS = 5 * 60
+NOVORAPID_HOURS = 6 # window over which a bolus contributes to IOB_novorapid
+TRESIBA_HOURS = 96 # window over which basal contributes to IOB_tresiba
+COB_HOURS = 48 # carbs_on_board decays as exp(-0.6 t), below 1e-12 of the carbs after 48 h
+# Impulses at or below these magnitudes are under the noise floor of the models and are not propagated
+_BOLUS_EPS = 1e-3 # units of insulin (bolus and basal)
+_CARB_EPS = 1e-2 # grams of carbs
+FFT_MIN_TAPS = 200 # kernels longer than this (tresiba) are convolved via FFT, shorter ones directly
+
+def _kernel_lags(hours):
+    """ Elapsed hours 0, 5 min, ..., hours on the 5-minute grid. """
+    steps = int(hours * 3600 // GRID_SECONDS)
+    return np.arange(steps + 1) * GRID_SECONDS / 3600.0
+
+@lru_cache(maxsize=None)
+def _grid_kernel(kind, hours):
+    """
+    Response to one unit (or gram for kind='carbs') at the 5-minute lags up to hours,
+    evaluated once per kind and window. kind is 'novorapid', 'tresiba' or 'carbs'.
+    """
+    lags = _kernel_lags(hours)
+    kernel = carbs_on_board(lags, 1.0) if kind == 'carbs' else insulin_on_board(lags, kind)
+    kernel.flags.writeable = False  # shared between calls
+    return kernel
+
+def _grid_convolve(grid_idx, impulses, kernel, eps):
+    """
+    Sum kernel responses of impulses above eps at positions grid_idx (sorted, unique 5-minute
+    steps) and return the total at those positions.
+    """
+    dense = np.zeros(grid_idx[-1] + 1)
+    dense[grid_idx] = np.where(impulses > eps, impulses, 0.0)
+    if len(kernel) > FFT_MIN_TAPS:
+        # Impulses and kernels are non-negative, clip the FFT round-off below zero
+        return np.maximum(fftconvolve(dense, kernel)[:len(dense)][grid_idx], 0.0)
+    return np.convolve(dense, kernel)[:len(dense)][grid_idx]
+
+def _propagate_kernel(elapsed_s, impulses, response, window_h, eps):
+    """
+    Sum the responses of impulses above eps at sorted elapsed_s (seconds, NaN last) over the future rows
+    within window_h hours, for timestamps off the 5-minute grid. response(hours) is the response
+    to one unit (or gram) at each lag; nothing is added at the event row itself (t=0).
+    """
+    events = np.flatnonzero(impulses > eps)
+    
+    # Rows are sorted, so the future rows within the window of each event are the slice [start, end)
+    starts = np.searchsorted(elapsed_s, elapsed_s[events], side='right')
+    ends = np.searchsorted(elapsed_s, elapsed_s[events] + window_h * 3600.0, side='right')
+    lengths = ends - starts
+    
+    # Flatten all (event, future row) pairs and add their contributions in one pass
+    pair_event = np.repeat(events, lengths)
+    pair_row = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    time_elapsed = (elapsed_s[pair_row] - elapsed_s[pair_event]) / 3600.0
+    contribution = impulses[pair_event] * response(time_elapsed)
+    # astype: bincount of no events returns integer zeros
+    return np.bincount(pair_row, weights=contribution, minlength=len(elapsed_s)).astype(np.float64, copy=False)
+
 def calculate_active_insulin_and_carbs_timeseries(data_df):
     """
-    Calculate active insulin by processing each bolus event sequentially.
-    For each row with bolus > 0, take current active insulin + new bolus effect.
+    Calculate insulin and carbs on board as the sum of the responses to all earlier bolus, basal and carb events.
+    On a regular 5-minute grid each impulse train is convolved with its kernel; otherwise every event is
+    propagated over the rows within its window using the interpolated unit responses.
     
     Parameters:
     -----------
@@ -23,7 +86,7 @@ def calculate_active_insulin_and_carbs_timeseries(data_df):
     Returns:
     --------
     pandas.DataFrame
-        Original DataFrame with added 'IOB_novorapid', 'IOB_tresiba', 'COB' columns
+        Original DataFrame with added 'IOB_novorapid', 'IOB_tresiba', 'COB', 'total_active_insulin' columns
     """
     
     # Make a copy to avoid modifying original data
@@ -33,124 +96,54 @@ def calculate_active_insulin_and_carbs_timeseries(data_df):
     bolus_columns = ['carb_bolus', 'correction_bolus', 'extended_bolus']
     carb_columns = ['carbs']
     basal_columns = ['basal']
-    df['total_bolus'] = df[bolus_columns].fillna(0).sum(axis=1)
-    df['total_carbs'] = df[carb_columns].fillna(0).sum(axis=1)
-    df['total_basal'] = df[basal_columns].fillna(0).sum(axis=1)
+    # float32 is plenty for doses and grams and halves the traffic through these mostly-zero columns
+    df['total_bolus'] = sum(df[c].fillna(0).astype(np.float32) for c in bolus_columns)
+    df['total_carbs'] = sum(df[c].fillna(0).astype(np.float32) for c in carb_columns)
+    df['total_basal'] = sum(df[c].fillna(0).astype(np.float32) for c in basal_columns)
 
     # Sort by datetime to ensure chronological order
     df = df.sort_values('DateTime_rounded').reset_index(drop=True)
     
-    # Initialize active insulin column
-    df['IOB_novorapid'] = 0.0
-    df['IOB_tresiba'] = 0.0
-    df['COB'] = 0.0
-    # Get rows with bolus events (non-zero boluses)
-    bolus_rows = df[df['total_bolus'] > 0].copy()
+    # Seconds since the first reading (NaN for missing timestamps, sorted last), computed once
+    # and shared by the grid check and all window lookups below
+    elapsed_s = (df['DateTime_rounded'] - df['DateTime_rounded'].min()).dt.total_seconds().to_numpy()
     
-    print(f"Processing {len(bolus_rows)} bolus events sequentially...")
+    # Regular 5-minute timestamps: convolve each impulse train with its kernel instead of
+    # propagating every event row by row
+    if len(df) > 0:
+        elapsed_steps = elapsed_s / GRID_SECONDS
+        if np.all(np.rint(elapsed_steps) == elapsed_steps) and np.all(np.diff(elapsed_steps) > 0):
+            grid_idx = elapsed_steps.astype(np.int64)
+            bolus, basal, carbs = (df[c].to_numpy() for c in ('total_bolus', 'total_basal', 'total_carbs'))
+            print(f"Processing {(bolus > 0).sum()} bolus events on the 5-minute grid...")
+            iob_novorapid = _grid_convolve(grid_idx, bolus, _grid_kernel('novorapid', NOVORAPID_HOURS),
+                                           _BOLUS_EPS)
+            iob_tresiba = _grid_convolve(grid_idx, basal, _grid_kernel('tresiba', TRESIBA_HOURS), _BOLUS_EPS)
+            cob = _grid_convolve(grid_idx, carbs, _grid_kernel('carbs', COB_HOURS), _CARB_EPS)
+            df = df.assign(IOB_novorapid=iob_novorapid, IOB_tresiba=iob_tresiba, COB=cob,
+                           total_active_insulin=iob_novorapid + iob_tresiba)
+            print("Completed bolus, basal and carb processing.")
+            return df
     
-    # Process each bolus row sequentially
-    for bolus_idx, (df_idx, bolus_row) in enumerate(bolus_rows.iterrows()):
-        current_time = bolus_row['DateTime_rounded']
-        current_bolus = bolus_row['total_bolus']
-        
-        # Get current active insulin level at this time point
-        current_active = df.loc[df_idx, 'IOB_novorapid']
-        
-        # Calculate new active insulin: current active + new bolus effect (at time 0)
-        new_bolus_effect = insulin_on_board(0, 'novorapid') * current_bolus  # At injection time (t=0)
-        new_active_total = current_active + new_bolus_effect
-        
-        # Write result back to this row
-        df.loc[df_idx, 'IOB_novorapid'] = new_active_total
-        
-        # Now propagate this bolus effect to all future timepoints
-        future_rows = df[df['DateTime_rounded'] > current_time].copy()
-        
-        for future_idx, future_row in future_rows.iterrows():
-            future_time = future_row['DateTime_rounded']
-            
-            # Calculate time elapsed since this bolus (in hours)
-            time_elapsed = (future_time - current_time).total_seconds() / 3600.0
-            
-            # Only apply if within insulin duration window (6 hours)
-            if 0 < time_elapsed <= 6:
-                # Calculate active insulin from this specific bolus at this future time
-                bolus_effect_at_time = insulin_on_board(time_elapsed,'novorapid') * current_bolus
-                
-                # Add this effect to the future row's active insulin
-                df.loc[future_idx, 'IOB_novorapid'] += bolus_effect_at_time
-        
-    print("Completed sequential bolus processing.")
+    # Irregular timestamps: propagate each event over the rows that follow it
+    print(f"Processing {(df['total_bolus'] > 0).sum()} bolus events off the 5-minute grid...")
+    df['IOB_novorapid'] = _propagate_kernel(elapsed_s, df['total_bolus'].to_numpy(),
+                                            partial(insulin_on_board_interp, type='novorapid'), NOVORAPID_HOURS,
+                                            _BOLUS_EPS)
+    print("Completed bolus processing.")
     
     # Now process basal insulin similarly
-    basal_rows = df[df['total_basal'] > 0].copy()
-
-    # Process each basal row sequentially
-    for basal_idx, (df_idx, basal_row) in enumerate(basal_rows.iterrows()):
-        current_time = basal_row['DateTime_rounded']
-        current_basal = basal_row['total_basal']
-        
-        # Get current active insulin level at this time point
-        current_active = df.loc[df_idx, 'IOB_tresiba']
-        
-        # Calculate new active insulin: current active + new bolus effect (at time 0)
-        new_basal_effect = insulin_on_board(0, 'tresiba') * current_basal  # At injection time (t=0)
-        new_active_total = current_active + new_basal_effect
-
-        # Write result back to this row
-        df.loc[df_idx, 'IOB_tresiba'] = new_active_total
-        
-        # Now propagate this bolus effect to all future timepoints
-        future_rows = df[df['DateTime_rounded'] > current_time].copy()
-        
-        for future_idx, future_row in future_rows.iterrows():
-            future_time = future_row['DateTime_rounded']
-            
-            # Calculate time elapsed since this bolus (in hours)
-            time_elapsed = (future_time - current_time).total_seconds() / 3600.0
-            
-            # Only apply if within insulin duration window (6 hours)
-            if 0 < time_elapsed <= 96:
-                # Calculate active insulin from this specific bolus at this future time
-                bolus_effect_at_time = insulin_on_board(time_elapsed, 'tresiba') * current_basal
-
-                # Add this effect to the future row's active insulin
-                df.loc[future_idx, 'IOB_tresiba'] += bolus_effect_at_time
-        
-        df['total_active_insulin'] = df['IOB_novorapid'] + df['IOB_tresiba']
-    
-    print("Completed sequential basal processing.")
+    df['IOB_tresiba'] = _propagate_kernel(elapsed_s, df['total_basal'].to_numpy(),
+                                          partial(insulin_on_board_interp, type='tresiba'), TRESIBA_HOURS,
+                                          _BOLUS_EPS)
+    print("Completed basal processing.")
 
     # Now process carbs absorption
-    carb_rows = df[df['total_carbs'] > 0].copy()
+    df['COB'] = _propagate_kernel(elapsed_s, df['total_carbs'].to_numpy(),
+                                  partial(carbs_on_board_interp, total_carbs=1.0), COB_HOURS, _CARB_EPS)
+    print("Completed carb processing.")
     
-    for carb_idx, (df_idx, carb_row) in enumerate(carb_rows.iterrows()):
-        current_time = carb_row['DateTime_rounded']
-        current_carb = carb_row['total_carbs']
-
-        # Get current carbs on board level at this time point
-        current_COB = df.loc[df_idx, 'COB']
-        
-        # Calculate new active insulin: current active + new bolus effect (at time 0)
-        new_carbs = carbs_on_board(0, current_carb)  # At injection time (t=0)
-        new_COB = current_COB + new_carbs
-
-        # Write result back to this row
-        df.loc[df_idx, 'COB'] = new_COB
-
-        # Now propagate this carb effect to all future timepoints
-        future_rows = df[df['DateTime_rounded'] > current_time].copy()
-        
-        for future_idx, future_row in future_rows.iterrows():
-            future_time = future_row['DateTime_rounded']
-            
-            # Calculate time elapsed since this bolus (in hours)
-            time_elapsed = (future_time - current_time).total_seconds() / 3600.0
-
-            df.loc[future_idx, 'COB'] += carbs_on_board(time_elapsed, current_carb)
-
-    print("Completed sequential carb processing.")
+    df['total_active_insulin'] = df['IOB_novorapid'].to_numpy() + df['IOB_tresiba'].to_numpy()
     return df
 
 def process_period(df_period, group_col ='DateTime_hour', 
@@ -199,20 +192,33 @@ def process_period(df_period, group_col ='DateTime_hour',
     # Reset index to make Date a column
     #CL is liters per min times 60 is liters per hour
     grouped = grouped.reset_index()
-    grouped['period_length'] = ((grouped['last_reading']  - grouped['first_reading']).dt.total_seconds() +5*60)/ 3600  # in hours
-    grouped['AoC'] = grouped['total_carbs'] + COB_start - COB_end
-    grouped['AUC_novorapid'] = grouped['total_bolus'] + IOB_novorapid_start - IOB_novorapid_end
-    grouped['AUC_tresiba'] = grouped['total_basal'] + IOB_tresiba_start - IOB_tresiba_end   
-    grouped['insulin_sensitivity_article'] = (grouped['AoC']/BW \
-                        -GEZI *60 * grouped['AUC_delta_glucose'] * CONVERSION/1000  \
-                        - V_g / BW * (glucose_end - glucose_start) * CONVERSION/1000  ) \
-                            / (1/(CL*60)*(grouped['AUC_novorapid'] + grouped['AUC_tresiba'])* grouped['AUC_abs_delta_glucose'] * CONVERSION /1000 / grouped['period_length'] )
-    grouped['insulin_sensitivity_Nadia'] = (grouped['AoC']/BW \
-                        -GEZI *60 * grouped['AUC_delta_glucose'] * CONVERSION /1000 \
-                        - V_g / BW * (glucose_end - glucose_start) * CONVERSION /1000 ) \
-                            / (1/CL*(grouped['AUC_novorapid'] )* grouped['AUC_abs_delta_glucose'] * CONVERSION / 1000/ grouped['period_length'] )
+    k_conv = CONVERSION / 1000.0
+    gezi_factor = GEZI * 60 * k_conv
+    vg_factor = V_g / BW * k_conv
+    cl_h = CL * 60.0
+    period_length = ((grouped['last_reading']  - grouped['first_reading']).dt.total_seconds().to_numpy() +5*60)/ 3600  # in hours
+    AoC = grouped['total_carbs'].to_numpy() + COB_start - COB_end
+    AUC_novorapid = grouped['total_bolus'].to_numpy() + IOB_novorapid_start - IOB_novorapid_end
+    AUC_tresiba = grouped['total_basal'].to_numpy() + IOB_tresiba_start - IOB_tresiba_end
+    # numerator and glucose exposure rate shared by both sensitivity estimates
+    glucose_balance = AoC/BW - gezi_factor * grouped['AUC_delta_glucose'].to_numpy() - vg_factor * (glucose_end - glucose_start)
+    abs_glucose_rate = grouped['AUC_abs_delta_glucose'].to_numpy() * k_conv / period_length
+    with np.errstate(divide='ignore', invalid='ignore'):
+        grouped = grouped.assign(
+            period_length=period_length,
+            AoC=AoC,
+            AUC_novorapid=AUC_novorapid,
+            AUC_tresiba=AUC_tresiba,
+            insulin_sensitivity_article=glucose_balance / ((AUC_novorapid + AUC_tresiba) / cl_h * abs_glucose_rate),
+            insulin_sensitivity_Nadia=glucose_balance / (AUC_novorapid / CL * abs_glucose_rate),
+        )
     return grouped
 
+# Periods of day as [start, end) hour bins, night wraps around midnight so it labels both ends
+PERIOD_BINS = [-np.inf, 7, 11, 15, 19, 23, np.inf]
+PERIOD_LABELS = ['night', 'morning', 'noon', 'evening', 'before bed', 'night']
+PERIOD_HOURS = {'morning': 4, 'noon': 4, 'evening': 4, 'before bed': 4, 'night': 8}
+
 def get_period_of_day(hour):
     """
     Convert hour to period of day:
@@ -224,16 +230,8 @@ def get_period_of_day(hour):
     21-23: before bed
     23-7: night
     """
-    if 7 <= hour < 11:
-        return 'morning'
-    elif 11 <= hour < 15:
-        return 'noon'
-    elif 15 <= hour < 19:
-        return 'evening'
-    elif 19 <= hour < 23:
-        return 'before bed'
-    else:  # 23-24 or 0-7
-        return 'night'
+    # NaN (and inf) fall past the last bin, which is night as well
+    return PERIOD_LABELS[min(bisect_right(PERIOD_BINS, hour) - 1, len(PERIOD_LABELS) - 1)]
     
 def get_period_hours(period):
     """
@@ -244,10 +242,21 @@ def get_period_hours(period):
     before bed (19-23): 4 hours
     night (23-7): 8 hours
     """
-    if period in ['morning', 'noon', 'evening', 'before bed']:
-        return 4
-    else:  # night
-        return 8
+    return PERIOD_HOURS.get(period, PERIOD_HOURS['night'])
+
+def get_period_of_day_vec(hours):
+    """
+    Vectorized get_period_of_day for a pandas Series of hours, binned in one pd.cut call.
+    Returns a categorical Series of periods.
+    """
+    periods = pd.cut(hours, bins=PERIOD_BINS, right=False, labels=PERIOD_LABELS, ordered=False)
+    return periods.fillna('night')
+
+def get_period_hours_vec(periods):
+    """
+    Vectorized get_period_hours for a pandas Series of periods of day.
+    """
+    return periods.astype(object).map(PERIOD_HOURS).fillna(PERIOD_HOURS['night']).astype(np.int64)
 
 def identify_glucose_events(df_data, glucose_threshold=12, lookback_hours=1, min_gap_hours=3, min_duration_hours=1):
     """
@@ -282,10 +291,9 @@ def identify_glucose_events(df_data, glucose_threshold=12, lookback_hours=1, min
     df_data_processed['event_number'] = None
     
     # Step 1: Find all moments where glucose is above threshold
-    high_glucose_mask = df_data_processed['glucose'] > glucose_threshold
-    high_glucose_moments = df_data_processed[high_glucose_mask].copy()
+    high_glucose_mask = (df_data_processed['glucose'] > glucose_threshold).to_numpy()
     
-    print(f"Found {len(high_glucose_moments)} moments with glucose > {glucose_threshold} mmol/L")
+    print(f"Found {np.count_nonzero(high_glucose_mask)} moments with glucose > {glucose_threshold} mmol/L")
     
     # Step 2: For each high glucose moment, find earliest bolus within lookback period
     # Ensure minimum gap between event starts
@@ -293,44 +301,61 @@ def identify_glucose_events(df_data, glucose_threshold=12, lookback_hours=1, min
     event_number = 1
     last_event_start_time = None
     
-    for idx, row in high_glucose_moments.iterrows():
-        current_time = row['DateTime_rounded']
-        time_window_start = current_time - pd.Timedelta(hours=lookback_hours)
-        
-        # Find bolus events in the lookback window
-        time_window_mask = (
-            (df_data_processed['DateTime_rounded'] >= time_window_start) & 
-            (df_data_processed['DateTime_rounded'] < current_time)
-        )
-        
-        bolus_mask = (
-            (df_data_processed['carb_bolus'] > 0) | 
-            (df_data_processed['correction_bolus'] > 0)
-        )
-        
-        candidate_boluses = df_data_processed[time_window_mask & bolus_mask].copy()
-        
-        if len(candidate_boluses) > 0:
-            earliest_bolus_idx = candidate_boluses['DateTime_rounded'].idxmin()
-            earliest_bolus_time = df_data_processed.loc[earliest_bolus_idx, 'DateTime_rounded']
-            
-            # Check minimum gap between events
-            if last_event_start_time is None or (earliest_bolus_time - last_event_start_time) >= pd.Timedelta(hours=min_gap_hours):
-                df_data_processed.loc[earliest_bolus_idx, 'event'] = 'start'
-                df_data_processed.loc[earliest_bolus_idx, 'event_number'] = event_number
-                last_event_start_time = earliest_bolus_time
-                events_found += 1
-                event_number += 1
+    # Timestamps as int64 ns in chronological order (stable, so ties keep row order), which
+    # makes the lookback window [time - lookback, time) of every moment a searchsorted slice
+    t_ns = df_data_processed['DateTime_rounded'].to_numpy(dtype='datetime64[ns]').view('i8')
+    has_time = df_data_processed['DateTime_rounded'].notna().to_numpy()
+    is_bolus = ((df_data_processed['carb_bolus'] > 0) | (df_data_processed['correction_bolus'] > 0)).to_numpy() & has_time
+    order = np.argsort(t_ns, kind='stable')
+    bolus_pos = np.flatnonzero(is_bolus[order])
+    
+    high_rows = np.flatnonzero(high_glucose_mask & has_time)
+    window_start = np.searchsorted(t_ns[order], t_ns[high_rows] - pd.Timedelta(hours=lookback_hours).value, side='left')
+    window_end = np.searchsorted(t_ns[order], t_ns[high_rows], side='left')
+    
+    # Earliest bolus in each window is the first bolus at or after the window start
+    next_bolus = np.searchsorted(bolus_pos, window_start)
+    earliest_pos = np.full(len(high_rows), len(order))
+    has_next = next_bolus < len(bolus_pos)
+    earliest_pos[has_next] = bolus_pos[next_bolus[has_next]]
+    earliest_rows = order[earliest_pos[earliest_pos < window_end]]
+    
+    # Check minimum gap between events, in order of the high glucose moments
+    start_rows = []
+    start_numbers = []
+    min_gap_ns = pd.Timedelta(hours=min_gap_hours).value
+    for earliest_bolus_row in earliest_rows:
+        earliest_bolus_time = t_ns[earliest_bolus_row]
+        if last_event_start_time is None or (earliest_bolus_time - last_event_start_time) >= min_gap_ns:
+            start_rows.append(earliest_bolus_row)
+            start_numbers.append(event_number)
+            last_event_start_time = earliest_bolus_time
+            events_found += 1
+            event_number += 1
+    
+    # Mark all starts in one positional write (a re-marked row keeps its last event number)
+    event_col = df_data_processed.columns.get_loc('event')
+    event_number_col = df_data_processed.columns.get_loc('event_number')
+    df_data_processed.iloc[start_rows, event_col] = 'start'
+    df_data_processed.iloc[start_rows, event_number_col] = start_numbers
     
     print(f"Successfully identified {events_found} insulin bolus events preceding high glucose moments")
     
     # Step 3: For each start event, find when glucose returns to start level
     print("Identifying when glucose returns to start event glucose level...")
     
-    start_events = df_data_processed[df_data_processed['event'] == 'start'].copy()
-    start_events_data = [(row['DateTime_rounded'], row['glucose'], row['event_number']) for _, row in start_events.iterrows()]
+    # Marked start rows in row order, with the event number each one ended up with
+    start_pos = np.unique(np.asarray(start_rows, dtype=np.int64))
+    start_numbers = df_data_processed['event_number'].to_numpy()[start_pos]
+    glucose = df_data_processed['glucose'].to_numpy(dtype=np.float64)
+    start_events_data = list(zip(t_ns[start_pos], glucose[start_pos], start_numbers))
     start_events_data.sort()
     
+    # Chronological views, so each event period is a searchsorted slice (missing times sort first)
+    t_sorted = t_ns[order]
+    glucose_sorted = glucose[order]
+    min_duration_ns = pd.Timedelta(hours=min_duration_hours).value
+    
     ends_found = 0
     
     for i, (start_time, start_glucose, event_num) in enumerate(start_events_data):
@@ -338,29 +363,19 @@ def identify_glucose_events(df_data, glucose_threshold=12, lookback_hours=1, min
         if i < len(start_events_data) - 1:
             period_end = start_events_data[i + 1][0]  # Next start time
         else:
-            period_end = df_data_processed['DateTime_rounded'].max()
-        
-        # Get data for this event period (after minimum duration)
-        minimum_end_time = start_time + pd.Timedelta(hours=min_duration_hours)
-        
-        period_mask = (
-            (df_data_processed['DateTime_rounded'] >= minimum_end_time) & 
-            (df_data_processed['DateTime_rounded'] < period_end) &
-            (df_data_processed['glucose'].notna())
-        )
+            period_end = t_sorted[-1]
         
-        period_data = df_data_processed[period_mask].copy().sort_values('DateTime_rounded')
+        # Data for this event period (after minimum duration) is [minimum_end_time, period_end)
+        period_start = np.searchsorted(t_sorted, start_time + min_duration_ns, side='left')
+        period_stop = np.searchsorted(t_sorted, period_end, side='left')
         
-        if len(period_data) > 0:
-            # Find first time glucose crosses back to or below start level
-            crossing_mask = period_data['glucose'] <= start_glucose
-            crossing_points = period_data[crossing_mask]
-            
-            if len(crossing_points) > 0:
-                first_crossing_idx = crossing_points.index[0]
-                df_data_processed.loc[first_crossing_idx, 'event'] = 'end'
-                df_data_processed.loc[first_crossing_idx, 'event_number'] = event_num
-                ends_found += 1
+        # Find first time glucose crosses back to or below start level (missing glucose never does)
+        crossing_mask = glucose_sorted[period_start:period_stop] <= start_glucose
+        if crossing_mask.any():
+            first_crossing_pos = order[period_start + np.argmax(crossing_mask)]
+            df_data_processed.iat[first_crossing_pos, event_col] = 'end'
+            df_data_processed.iat[first_crossing_pos, event_number_col] = event_num
+            ends_found += 1
     
     print(f"Successfully identified {ends_found} end events")
     
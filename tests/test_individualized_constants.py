@@ -0,0 +1,8 @@
+from diabet_tools.individualized_constants import (calculate_insulin_clearance,
+                                                  calculate_glucose_volume_distribution)
+
+
+def test_bsa_methods_clamp_zero_weight():
+    # A weight of 0 (unknown) gives a BSA of 0, which is clamped to the lower bounds
+    assert calculate_insulin_clearance(170, 0, 30, 'male', 'bsa') == 0.5
+    assert calculate_glucose_volume_distribution(170, 0, 30, 'male', 'bsa_based') == 5.0
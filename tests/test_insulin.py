@@ -0,0 +1,9 @@
+import numpy as np
+
+from diabet_tools.insulin import calculate_insulin_clearance, tresiba_active_insulin
+
+
+def test_bsa_clearance_clamps_zero_weight():
+    assert calculate_insulin_clearance(170, 0, None, 'male', 'bsa') == 0.5
+    active = tresiba_active_insulin(np.array([0.0, 5.0, 24.0]), weight_kg=0, clearance_method='bsa')
+    assert np.all(np.isfinite(active))